@@ -1,5 +1,5 @@
-from app import app
-from models import db, Hub, Employee, AsistenciasComment, LiquidacionRuta, LiquidacionEntry
+from app import app, refresh_hub_daily_facts
+from models import db, Hub, Employee, AsistenciasComment, AsistenciasChange, LiquidacionRuta, LiquidacionEntry, LiquidacionReportCache, HubDailyFact
 from sqlalchemy import func
 
 def find_hub_by_name_ci(name: str):
@@ -31,6 +31,18 @@ def merge_hubs(from_name: str, to_name: str):
     # Liquidacion routes
     LiquidacionRuta.query.filter_by(hub_id=src.id).update({"hub_id": dst.id})
 
+    # Feed de cambios (los clientes recargan igual)
+    AsistenciasChange.query.filter_by(hub_id=src.id).update({"hub_id": dst.id})
+
+    # Informes cacheados: los de ambos HUBs ya no valen
+    LiquidacionReportCache.query.filter(
+        LiquidacionReportCache.hub_id.in_([src.id, dst.id])
+    ).delete(synchronize_session=False)
+
+    # Hechos diarios: se rehacen en el destino con empleados y rutas ya movidos
+    HubDailyFact.query.filter_by(hub_id=src.id).delete(synchronize_session=False)
+    refresh_hub_daily_facts("0000-01-01", "9999-12-31", hub_id=dst.id)
+
     db.session.delete(src)
     db.session.commit()
     print(f"✅ Fusionado: '{from_name}' -> '{to_name}'")
@@ -96,6 +96,21 @@ def run_migrations_online():
 
     connectable = get_engine()
 
+    # El buscador de empleados vive fuera de los modelos (models.EMPLOYEE_SEARCH_DDL_*):
+    # tabla FTS5 + tablas sombra en SQLite, índice pg_trgm en Postgres.
+    # Autogenerate no debe proponer borrarlos.
+    search_objects = {"ix_employees_name_norm_trgm"}
+
+    def include_object(object, name, type_, reflected, compare_to):
+        if type_ == "table" and (name or "").startswith("employees_fts"):
+            return False
+        if type_ == "index" and name in search_objects:
+            return False
+        return True
+
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
+
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
@@ -0,0 +1,44 @@
+"""hub_daily_facts (asistencia + kilos/litros + caja por HUB, día y ruta)
+
+Revision ID: 0a4e6c8b3d71
+Revises: f1c7a3e9d502
+Create Date: 2026-10-19 18:57:30.662418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a4e6c8b3d71'
+down_revision = 'f1c7a3e9d502'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # se rellena con `flask refresh-hub-facts --all` (y luego el cron nocturno)
+    op.create_table(
+        'hub_daily_facts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hub_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.String(length=10), nullable=False),
+        sa.Column('route', sa.String(length=50), nullable=False),
+        sa.Column('dias_trabajados', sa.Integer(), nullable=False),
+        sa.Column('festivos', sa.Integer(), nullable=False),
+        sa.Column('kilos_registros', sa.Integer(), nullable=False),
+        sa.Column('clientes', sa.Integer(), nullable=False),
+        sa.Column('kilos', sa.Float(), nullable=False),
+        sa.Column('litros', sa.Float(), nullable=False),
+        sa.Column('liq_registros', sa.Integer(), nullable=False),
+        sa.Column('metalico_cents', sa.Integer(), nullable=False),
+        sa.Column('ingreso_cents', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.ForeignKeyConstraint(['hub_id'], ['hubs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('hub_id', 'day', 'route', name='uq_hub_daily_fact'),
+    )
+
+
+def downgrade():
+    op.drop_table('hub_daily_facts')
@@ -0,0 +1,53 @@
+"""liquidacion_entries: metalico_cents / ingreso_cents
+
+Revision ID: 1d6f9a3c8b52
+Revises: e8a41f0b9c27
+Create Date: 2026-10-19 14:02:13.540918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = '1d6f9a3c8b52'
+down_revision = 'e8a41f0b9c27'
+branch_labels = None
+depends_on = None
+
+
+# mismo criterio que app.to_float_es: "1.268,05" -> 126805
+def _to_cents(v):
+    s = str(v or "").strip()
+    if s == "":
+        return 0
+    s = s.replace(".", "").replace(",", ".")
+    try:
+        return int(round(float(s) * 100))
+    except (ValueError, OverflowError):  # "nan" / "inf"
+        return 0
+
+
+def upgrade():
+    with op.batch_alter_table('liquidacion_entries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('metalico_cents', sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column('ingreso_cents', sa.Integer(), nullable=False, server_default="0"))
+
+    conn = op.get_bind()
+    rows = conn.execute(text(
+        "SELECT id, metalico, ingreso FROM liquidacion_entries "
+        "WHERE metalico <> '' OR ingreso <> ''"
+    )).fetchall()
+    params = [{"id": r[0], "m": _to_cents(r[1]), "i": _to_cents(r[2])} for r in rows]
+    if params:
+        conn.execute(
+            text("UPDATE liquidacion_entries SET metalico_cents = :m, ingreso_cents = :i WHERE id = :id"),
+            params,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('liquidacion_entries', schema=None) as batch_op:
+        batch_op.drop_column('ingreso_cents')
+        batch_op.drop_column('metalico_cents')
@@ -0,0 +1,37 @@
+"""hub_contactos: índice parcial por nombre con columnas simples (sin "id DESC")
+
+Revision ID: 2c6d8f0a4e17
+Revises: 9e1a7c3f5b28
+Create Date: 2026-10-19 22:14:06.512390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c6d8f0a4e17'
+down_revision = '9e1a7c3f5b28'
+branch_labels = None
+depends_on = None
+
+
+NAME = 'ix_hub_contactos_hub_active_nombre'
+
+
+def _recreate(cols):
+    op.drop_index(NAME, table_name='hub_contactos')
+    op.create_index(
+        NAME, 'hub_contactos', cols, unique=False,
+        sqlite_where=sa.text('active = 1'),
+        postgresql_where=sa.text('active'),
+    )
+
+
+def upgrade():
+    # con una expresión ("id DESC") autogenerate lo daba por cambiado en cada check
+    _recreate(['hub_id', 'nombre', 'id'])
+
+
+def downgrade():
+    _recreate(['hub_id', 'nombre', sa.text('id DESC')])
@@ -0,0 +1,51 @@
+"""liquidacion_entries: repartidor_key + índice (repartidor_key, day)
+
+Revision ID: 3a9d6e2f7b14
+Revises: 7c2e5b8d1f93
+Create Date: 2026-10-19 15:11:36.874402
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = '3a9d6e2f7b14'
+down_revision = '7c2e5b8d1f93'
+branch_labels = None
+depends_on = None
+
+
+# copia de models.normalize_name_key (la migración no importa models)
+def normalize_name_key(s):
+    s = unicodedata.normalize("NFKD", str(s or ""))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = re.sub(r"[^0-9a-z]+", " ", s.lower())
+    return " ".join(s.split())
+
+
+def upgrade():
+    with op.batch_alter_table('liquidacion_entries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('repartidor_key', sa.String(length=200), nullable=False, server_default=""))
+        batch_op.create_index('ix_liq_entries_repartidor_key_day', ['repartidor_key', 'day'], unique=False)
+
+    conn = op.get_bind()
+    rows = conn.execute(text(
+        "SELECT id, repartidor FROM liquidacion_entries WHERE repartidor <> ''"
+    )).fetchall()
+    params = [{"id": r[0], "k": normalize_name_key(r[1])} for r in rows]
+    if params:
+        conn.execute(text("UPDATE liquidacion_entries SET repartidor_key = :k WHERE id = :id"), params)
+
+    # el informe de cuadre ahora agrupa por repartidor_key
+    op.execute("DELETE FROM liquidacion_report_cache")
+
+
+def downgrade():
+    with op.batch_alter_table('liquidacion_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_liq_entries_repartidor_key_day')
+        batch_op.drop_column('repartidor_key')
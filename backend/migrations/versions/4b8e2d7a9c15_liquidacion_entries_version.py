@@ -0,0 +1,26 @@
+"""liquidacion_entries: version (precondición del PATCH por días)
+
+Revision ID: 4b8e2d7a9c15
+Revises: 0a4e6c8b3d71
+Create Date: 2026-10-19 20:41:08.215734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e2d7a9c15'
+down_revision = '0a4e6c8b3d71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('liquidacion_entries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    with op.batch_alter_table('liquidacion_entries', schema=None) as batch_op:
+        batch_op.drop_column('version')
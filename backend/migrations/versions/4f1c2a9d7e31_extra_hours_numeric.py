@@ -0,0 +1,47 @@
+"""extra_hours: columna numérica hours_num
+
+Revision ID: 4f1c2a9d7e31
+Revises: b09b5bb6142b
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+import math
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1c2a9d7e31'
+down_revision = 'b09b5bb6142b'
+branch_labels = None
+depends_on = None
+
+
+def _parse_hours(v):
+    s = str(v or "").strip().replace(",", ".")
+    if s == "":
+        return 0.0
+    try:
+        f = float(s)
+    except ValueError:
+        return 0.0
+    return f if math.isfinite(f) else 0.0  # "nan" / "inf"
+
+
+def upgrade():
+    with op.batch_alter_table('extra_hours', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hours_num', sa.Float(), nullable=False, server_default="0"))
+
+    # backfill: "0,5" -> 0.5 (en Python para tolerar valores raros)
+    conn = op.get_bind()
+    rows = conn.execute(text("SELECT id, hours FROM extra_hours WHERE hours <> ''")).fetchall()
+    params = [{"id": r[0], "v": _parse_hours(r[1])} for r in rows]
+    if params:
+        conn.execute(text("UPDATE extra_hours SET hours_num = :v WHERE id = :id"), params)
+
+
+def downgrade():
+    with op.batch_alter_table('extra_hours', schema=None) as batch_op:
+        batch_op.drop_column('hours_num')
@@ -0,0 +1,43 @@
+"""liquidacion_month_rollup (totales por ruta y mes) + backfill
+
+Revision ID: 5e7b2c9a4d61
+Revises: 3a9d6e2f7b14
+Create Date: 2026-10-19 16:12:04.583190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7b2c9a4d61'
+down_revision = '3a9d6e2f7b14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'liquidacion_month_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('route_id', sa.Integer(), nullable=False),
+        sa.Column('month_key', sa.String(length=7), nullable=False),
+        sa.Column('days', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('metalico_cents', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('ingreso_cents', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.ForeignKeyConstraint(['route_id'], ['liquidacion_rutas.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('route_id', 'month_key', name='uq_liq_rollup_route_month'),
+    )
+
+    op.get_bind().execute(text(
+        "INSERT INTO liquidacion_month_rollup (route_id, month_key, days, metalico_cents, ingreso_cents) "
+        "SELECT route_id, substr(day, 1, 7), count(*), sum(metalico_cents), sum(ingreso_cents) "
+        "FROM liquidacion_entries GROUP BY route_id, substr(day, 1, 7)"
+    ))
+
+
+def downgrade():
+    op.drop_table('liquidacion_month_rollup')
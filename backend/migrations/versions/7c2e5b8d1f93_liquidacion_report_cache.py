@@ -0,0 +1,34 @@
+"""liquidacion_report_cache (informe de cuadre por HUB y mes)
+
+Revision ID: 7c2e5b8d1f93
+Revises: 1d6f9a3c8b52
+Create Date: 2026-10-19 14:40:58.120334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e5b8d1f93'
+down_revision = '1d6f9a3c8b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'liquidacion_report_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hub_id', sa.Integer(), nullable=False),
+        sa.Column('month_key', sa.String(length=7), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.ForeignKeyConstraint(['hub_id'], ['hubs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('hub_id', 'month_key', name='uq_liq_report_hub_month'),
+    )
+
+
+def downgrade():
+    op.drop_table('liquidacion_report_cache')
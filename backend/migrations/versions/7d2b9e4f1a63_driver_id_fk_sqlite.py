@@ -0,0 +1,56 @@
+"""driver_id: FK a drivers también en SQLite (batch mode)
+
+Revision ID: 7d2b9e4f1a63
+Revises: 2c6d8f0a4e17
+Create Date: 2026-10-19 22:41:18.630254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2b9e4f1a63'
+down_revision = '2c6d8f0a4e17'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['employees', 'kilos_litros', 'liquidacion_entries']
+
+# batch mode recrea employees y se lleva sus triggers: se vuelven a crear
+# (copia de e8a41f0b9c27.SQLITE_DDL sin la tabla virtual, que no se toca)
+EMPLOYEES_FTS_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS employees_fts_ai AFTER INSERT ON employees BEGIN "
+    "INSERT INTO employees_fts(rowid, name_norm) VALUES (new.id, new.name_norm); END",
+    "CREATE TRIGGER IF NOT EXISTS employees_fts_ad AFTER DELETE ON employees BEGIN "
+    "INSERT INTO employees_fts(employees_fts, rowid, name_norm) VALUES ('delete', old.id, old.name_norm); END",
+    "CREATE TRIGGER IF NOT EXISTS employees_fts_au AFTER UPDATE OF name_norm ON employees BEGIN "
+    "INSERT INTO employees_fts(employees_fts, rowid, name_norm) VALUES ('delete', old.id, old.name_norm); "
+    "INSERT INTO employees_fts(rowid, name_norm) VALUES (new.id, new.name_norm); END",
+]
+
+
+def upgrade():
+    # en Postgres f1c7a3e9d502 ya creó las FKs con add_column
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_foreign_key(f'fk_{table}_driver_id', 'drivers', ['driver_id'], ['id'])
+
+    for sql in EMPLOYEES_FTS_TRIGGERS:
+        op.execute(sql)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_driver_id', type_='foreignkey')
+
+    for sql in EMPLOYEES_FTS_TRIGGERS:
+        op.execute(sql)
@@ -0,0 +1,42 @@
+"""índices compuestos / parciales (WHERE active) para los listados por HUB
+
+Revision ID: 8d3f1a6c2e95
+Revises: 5e7b2c9a4d61
+Create Date: 2026-10-19 17:03:27.904112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3f1a6c2e95'
+down_revision = '5e7b2c9a4d61'
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, columnas, columna booleana del WHERE)
+INDEXES = [
+    ('ix_employees_hub_active_name', 'employees', ['hub_id', 'name'], 'active'),
+    ('ix_flota_vehiculos_hub_active_matricula', 'flota_vehiculos', ['hub_id', 'matricula'], 'active'),
+    ('ix_kilos_litros_hub_active_month', 'kilos_litros', ['hub_id', 'year', 'month', 'day', 'ruta_numero'], 'active'),
+    ('ix_kilos_litros_hub_active_day', 'kilos_litros', ['hub_id', 'day', 'ruta_numero', 'id'], 'active'),
+    ('ix_hub_compras_hub_active_created', 'hub_compras', ['hub_id', 'created_at', 'id'], 'active'),
+    ('ix_hub_contactos_hub_active_nombre', 'hub_contactos', ['hub_id', 'nombre', sa.text('id DESC')], 'active'),
+    ('ix_reparto_clientes_hub_route_activo_nombre', 'reparto_clientes', ['hub_id', 'route_id', 'nombre'], 'activo'),
+]
+
+
+def upgrade():
+    for name, table, cols, flag in INDEXES:
+        op.create_index(
+            name, table, cols, unique=False,
+            sqlite_where=sa.text(f'{flag} = 1'),
+            postgresql_where=sa.text(flag),
+        )
+
+
+def downgrade():
+    for name, table, _cols, _flag in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
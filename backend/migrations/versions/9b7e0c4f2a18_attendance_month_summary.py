@@ -0,0 +1,65 @@
+"""attendance_month_summary (resumen mensual por empleado)
+
+Revision ID: 9b7e0c4f2a18
+Revises: 4f1c2a9d7e31
+Create Date: 2026-10-19 11:03:27.904112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = '9b7e0c4f2a18'
+down_revision = '4f1c2a9d7e31'
+branch_labels = None
+depends_on = None
+
+
+CODE_COLUMNS = {
+    "1": "code_1", "F": "code_f", "D": "code_d", "V": "code_v", "E": "code_e",
+    "L": "code_l", "O": "code_o", "M": "code_m", "C": "code_c",
+}
+
+
+def upgrade():
+    op.create_table(
+        'attendance_month_summary',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('employee_id', sa.Integer(), nullable=False),
+        sa.Column('month_key', sa.String(length=7), nullable=False),
+        *[
+            sa.Column(col, sa.Integer(), nullable=False, server_default="0")
+            for col in CODE_COLUMNS.values()
+        ],
+        sa.Column('extra_hours_total', sa.Float(), nullable=False, server_default="0"),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('employee_id', 'month_key', name='uq_employee_month_summary'),
+    )
+
+    # backfill desde attendance + extra_hours
+    counts = ", ".join(
+        f"SUM(CASE WHEN code = '{code}' THEN 1 ELSE 0 END)" for code in CODE_COLUMNS
+    )
+    cols = ", ".join(CODE_COLUMNS.values())
+    op.execute(text(f"""
+        INSERT INTO attendance_month_summary (employee_id, month_key, {cols})
+        SELECT employee_id, SUBSTR(day, 1, 7), {counts}
+        FROM attendance
+        GROUP BY employee_id, SUBSTR(day, 1, 7)
+    """))
+    op.execute(text("""
+        INSERT INTO attendance_month_summary (employee_id, month_key, extra_hours_total)
+        SELECT employee_id, SUBSTR(day, 1, 7), SUM(hours_num)
+        FROM extra_hours
+        GROUP BY employee_id, SUBSTR(day, 1, 7)
+        ON CONFLICT (employee_id, month_key)
+        DO UPDATE SET extra_hours_total = excluded.extra_hours_total
+    """))
+
+
+def downgrade():
+    op.drop_table('attendance_month_summary')
@@ -0,0 +1,28 @@
+"""liquidacion_report_cache: version (no guardar informes calculados con datos viejos)
+
+Revision ID: 9e1a7c3f5b28
+Revises: 4b8e2d7a9c15
+Create Date: 2026-10-19 20:58:44.903127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e1a7c3f5b28'
+down_revision = '4b8e2d7a9c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('liquidacion_report_cache', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    # las filas vacías (caducadas) no tienen sentido sin version
+    op.execute("DELETE FROM liquidacion_report_cache WHERE payload = ''")
+    with op.batch_alter_table('liquidacion_report_cache', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,94 @@
+"""kilos_litros_rollup (series día / semana / mes por HUB, ruta y nombre) + backfill
+
+Revision ID: b6a0d4e8f213
+Revises: 8d3f1a6c2e95
+Create Date: 2026-10-19 17:48:12.336054
+
+"""
+import re
+import unicodedata
+from datetime import date, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6a0d4e8f213'
+down_revision = '8d3f1a6c2e95'
+branch_labels = None
+depends_on = None
+
+
+# copia de models.normalize_name_key (la migración no importa models)
+def normalize_name_key(s):
+    s = unicodedata.normalize("NFKD", str(s or ""))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = re.sub(r"[^0-9a-z]+", " ", s.lower())
+    return " ".join(s.split())
+
+
+def _periods(d):
+    return (
+        ("day", d),
+        ("week", d - timedelta(days=d.weekday())),
+        ("month", d.replace(day=1)),
+    )
+
+
+def upgrade():
+    rollup = op.create_table(
+        'kilos_litros_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hub_id', sa.Integer(), nullable=False),
+        sa.Column('grain', sa.String(length=5), nullable=False),
+        sa.Column('period', sa.String(length=10), nullable=False),
+        sa.Column('dim', sa.String(length=6), nullable=False),
+        sa.Column('dim_key', sa.String(length=200), nullable=False),
+        sa.Column('label', sa.String(length=200), nullable=False),
+        sa.Column('registros', sa.Integer(), nullable=False),
+        sa.Column('clientes', sa.Integer(), nullable=False),
+        sa.Column('kilos', sa.Float(), nullable=False),
+        sa.Column('litros', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['hub_id'], ['hubs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('hub_id', 'grain', 'dim', 'dim_key', 'period', name='uq_kilos_rollup_series_period'),
+    )
+
+    bind = op.get_bind()
+    agg = {}
+    rows = bind.execute(text(
+        "SELECT hub_id, day, ruta_numero, nombre, clientes, kilos, litros "
+        "FROM kilos_litros WHERE active = :active"
+    ), {"active": True})
+    for r in rows:
+        try:
+            d = date.fromisoformat(r.day)
+        except (TypeError, ValueError):
+            continue
+        for grain, p in _periods(d):
+            for dim, key, label in (
+                ("hub", "", ""),
+                ("ruta", str(r.ruta_numero), str(r.ruta_numero)),
+                ("nombre", normalize_name_key(r.nombre), r.nombre),
+            ):
+                k = (r.hub_id, grain, p, dim, key)
+                a = agg.get(k)
+                if a is None:
+                    a = agg[k] = {
+                        "hub_id": r.hub_id, "grain": grain, "period": p.isoformat(),
+                        "dim": dim, "dim_key": key, "label": label,
+                        "registros": 0, "clientes": 0, "kilos": 0.0, "litros": 0.0,
+                    }
+                a["registros"] += 1
+                a["clientes"] += r.clientes or 0
+                a["kilos"] += r.kilos or 0
+                a["litros"] += r.litros or 0
+
+    if agg:
+        op.bulk_insert(rollup, list(agg.values()))
+
+
+def downgrade():
+    op.drop_table('kilos_litros_rollup')
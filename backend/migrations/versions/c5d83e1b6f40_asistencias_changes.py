@@ -0,0 +1,41 @@
+"""asistencias_changes (feed de cambios para sync incremental)
+
+Revision ID: c5d83e1b6f40
+Revises: 9b7e0c4f2a18
+Create Date: 2026-10-19 11:48:05.662931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d83e1b6f40'
+down_revision = '9b7e0c4f2a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'asistencias_changes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hub_id', sa.Integer(), nullable=False),
+        sa.Column('month_key', sa.String(length=7), nullable=False, server_default=""),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('employee_id', sa.Integer(), nullable=True),
+        sa.Column('day', sa.String(length=10), nullable=False, server_default=""),
+        sa.Column('value', sa.Text(), nullable=False, server_default=""),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.ForeignKeyConstraint(['hub_id'], ['hubs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('asistencias_changes', schema=None) as batch_op:
+        batch_op.create_index('ix_asistencias_changes_hub_id', ['hub_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('asistencias_changes', schema=None) as batch_op:
+        batch_op.drop_index('ix_asistencias_changes_hub_id')
+
+    op.drop_table('asistencias_changes')
@@ -0,0 +1,81 @@
+"""employees: name_norm + índice de búsqueda (FTS5 / pg_trgm)
+
+Revision ID: e8a41f0b9c27
+Revises: c5d83e1b6f40
+Create Date: 2026-10-19 12:35:50.217733
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a41f0b9c27'
+down_revision = 'c5d83e1b6f40'
+branch_labels = None
+depends_on = None
+
+
+# copia de models.normalize_name_key (la migración no importa models)
+def normalize_name_key(s):
+    s = unicodedata.normalize("NFKD", str(s or ""))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = re.sub(r"[^0-9a-z]+", " ", s.lower())
+    return " ".join(s.split())
+
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS employees_fts "
+    "USING fts5(name_norm, content='employees', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS employees_fts_ai AFTER INSERT ON employees BEGIN "
+    "INSERT INTO employees_fts(rowid, name_norm) VALUES (new.id, new.name_norm); END",
+    "CREATE TRIGGER IF NOT EXISTS employees_fts_ad AFTER DELETE ON employees BEGIN "
+    "INSERT INTO employees_fts(employees_fts, rowid, name_norm) VALUES ('delete', old.id, old.name_norm); END",
+    "CREATE TRIGGER IF NOT EXISTS employees_fts_au AFTER UPDATE OF name_norm ON employees BEGIN "
+    "INSERT INTO employees_fts(employees_fts, rowid, name_norm) VALUES ('delete', old.id, old.name_norm); "
+    "INSERT INTO employees_fts(rowid, name_norm) VALUES (new.id, new.name_norm); END",
+]
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_employees_name_norm_trgm "
+    "ON employees USING gin (name_norm gin_trgm_ops)",
+]
+
+
+def upgrade():
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('name_norm', sa.String(length=200), nullable=False, server_default=""))
+        batch_op.create_index('ix_employees_name_norm', ['name_norm'], unique=False)
+
+    conn = op.get_bind()
+    rows = conn.execute(text("SELECT id, name FROM employees")).fetchall()
+    params = [{"id": r[0], "v": normalize_name_key(r[1])} for r in rows]
+    if params:
+        conn.execute(text("UPDATE employees SET name_norm = :v WHERE id = :id"), params)
+
+    if conn.dialect.name == "sqlite":
+        for sql in SQLITE_DDL:
+            op.execute(sql)
+        op.execute("INSERT INTO employees_fts(employees_fts) VALUES ('rebuild')")
+    elif conn.dialect.name == "postgresql":
+        for sql in POSTGRES_DDL:
+            op.execute(sql)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == "sqlite":
+        for trg in ("employees_fts_ai", "employees_fts_ad", "employees_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trg}")
+        op.execute("DROP TABLE IF EXISTS employees_fts")
+    elif conn.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_employees_name_norm_trgm")
+
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.drop_index('ix_employees_name_norm')
+        batch_op.drop_column('name_norm')
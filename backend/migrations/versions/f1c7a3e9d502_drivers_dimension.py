@@ -0,0 +1,101 @@
+"""drivers (conductor por nombre normalizado) + driver_id en employees, kilos_litros y liquidacion_entries
+
+Revision ID: f1c7a3e9d502
+Revises: b6a0d4e8f213
+Create Date: 2026-10-19 18:21:45.117803
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c7a3e9d502'
+down_revision = 'b6a0d4e8f213'
+branch_labels = None
+depends_on = None
+
+
+# copia de models.normalize_name_key (la migración no importa models)
+def normalize_name_key(s):
+    s = unicodedata.normalize("NFKD", str(s or ""))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = re.sub(r"[^0-9a-z]+", " ", s.lower())
+    return " ".join(s.split())
+
+
+# tabla -> columna con el nombre libre
+SOURCES = [
+    ('employees', 'name'),
+    ('kilos_litros', 'nombre'),
+    ('liquidacion_entries', 'repartidor'),
+]
+
+
+def upgrade():
+    drivers = op.create_table(
+        'drivers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name_key', sa.String(length=200), nullable=False),
+        sa.Column('display_name', sa.String(length=200), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name_key'),
+    )
+
+    # ADD COLUMN sin recrear la tabla: en SQLite batch mode recrearía employees
+    # y se perderían los triggers de employees_fts. SQLite no deja añadir la FK
+    # con ALTER (ni la aplica por defecto), así que solo va en Postgres.
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for table, index, cols in (
+        ('employees', 'ix_employees_driver_id', ['driver_id']),
+        ('kilos_litros', 'ix_kilos_litros_driver_day', ['driver_id', 'day']),
+        ('liquidacion_entries', 'ix_liq_entries_driver_day', ['driver_id', 'day']),
+    ):
+        fk = [] if sqlite else [sa.ForeignKey('drivers.id', name=f'fk_{table}_driver_id')]
+        op.add_column(table, sa.Column('driver_id', sa.Integer(), *fk, nullable=True))
+        op.create_index(index, table, cols, unique=False)
+
+    # backfill: un conductor por nombre normalizado, luego driver_id por texto distinto
+    conn = op.get_bind()
+    texts = {}
+    for table, col in SOURCES:
+        texts[table] = [r[0] for r in conn.execute(text(
+            f"SELECT DISTINCT {col} FROM {table} WHERE {col} <> ''"
+        ))]
+
+    labels = {}
+    for table, _col in SOURCES:
+        for t in texts[table]:
+            k = normalize_name_key(t)
+            if k:
+                labels.setdefault(k, " ".join(t.split())[:200])
+    if not labels:
+        return
+
+    op.bulk_insert(drivers, [{"name_key": k, "display_name": v} for k, v in labels.items()])
+    ids = dict(conn.execute(text("SELECT name_key, id FROM drivers")).fetchall())
+
+    for table, col in SOURCES:
+        params = [
+            {"t": t, "d": ids[normalize_name_key(t)]}
+            for t in texts[table] if normalize_name_key(t)
+        ]
+        if params:
+            conn.execute(text(f"UPDATE {table} SET driver_id = :d WHERE {col} = :t"), params)
+
+
+def downgrade():
+    for table, index in (
+        ('liquidacion_entries', 'ix_liq_entries_driver_day'),
+        ('kilos_litros', 'ix_kilos_litros_driver_day'),
+        ('employees', 'ix_employees_driver_id'),
+    ):
+        op.drop_index(index, table_name=table)
+        op.drop_column(table, 'driver_id')
+
+    op.drop_table('drivers')
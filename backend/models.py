@@ -1,10 +1,27 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date
-from sqlalchemy import func
+from sqlalchemy import func, event, DDL
+import re
+import unicodedata
 
 db = SQLAlchemy()
 
 
+def normalize_name_key(s: str) -> str:
+    """
+    Clave de búsqueda de nombres: sin acentos, minúsculas, solo letras/dígitos.
+    "Núñez,  José" -> "nunez jose"
+    """
+    s = unicodedata.normalize("NFKD", str(s or ""))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = re.sub(r"[^0-9a-z]+", " ", s.lower())
+    return " ".join(s.split())
+
+
+def _name_norm_default(context):
+    return normalize_name_key(context.get_current_parameters().get("name"))
+
+
 # ======================================================
 # USUARIOS
 # ======================================================
@@ -45,6 +62,41 @@ class Hub(db.Model):
         return f"<Hub {self.name}>"
 
 
+def active_index(name, *cols, flag="active"):
+    """
+    Índice para listados "solo activos": parcial (WHERE flag) en SQLite y Postgres.
+    SQLite compara el WHERE tal cual -> "= 1", que es como guarda los booleanos.
+    """
+    return db.Index(
+        name,
+        *cols,
+        sqlite_where=db.text(f"{flag} = 1"),
+        postgresql_where=db.text(flag),
+    )
+
+
+# ======================================================
+# CONDUCTORES (dimensión común a empleados, kilos y liquidaciones)
+# ======================================================
+
+class Driver(db.Model):
+    """
+    Una persona identificada por su nombre normalizado (normalize_name_key).
+    Employee.name, KilosLitros.nombre y LiquidacionEntry.repartidor apuntan
+    aquí con driver_id -> los cruces van por entero e índice, no por texto.
+    """
+    __tablename__ = "drivers"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name_key = db.Column(db.String(200), nullable=False, unique=True)
+    display_name = db.Column(db.String(200), nullable=False, default="")
+
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<Driver {self.name_key}>"
+
+
 # ======================================================
 # EMPLEADOS
 # ======================================================
@@ -57,6 +109,12 @@ class Employee(db.Model):
     name = db.Column(db.String(200), nullable=False)
     active = db.Column(db.Boolean, nullable=False, default=True)
 
+    # ✅ nombre normalizado para búsqueda ("Núñez" -> "nunez"), se rellena solo
+    name_norm = db.Column(
+        db.String(200), nullable=False, default=_name_norm_default, server_default=""
+    )
+    driver_id = db.Column(db.Integer, db.ForeignKey("drivers.id"), nullable=True, index=True)
+
     created_at = db.Column(
         db.DateTime, server_default=db.func.now(), nullable=False
     )
@@ -65,12 +123,40 @@ class Employee(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("hub_id", "name", name="uq_employee_hub_name"),
+        db.Index("ix_employees_name_norm", "name_norm"),
+        active_index("ix_employees_hub_active_name", "hub_id", "name"),
     )
 
     def __repr__(self):
         return f"<Employee {self.name} (Hub {self.hub_id})>"
 
 
+# Índice de búsqueda por nombre:
+# - SQLite: FTS5 (employees_fts) sincronizada con triggers
+# - Postgres: pg_trgm + GIN sobre name_norm
+EMPLOYEE_SEARCH_DDL_SQLITE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS employees_fts "
+    "USING fts5(name_norm, content='employees', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS employees_fts_ai AFTER INSERT ON employees BEGIN "
+    "INSERT INTO employees_fts(rowid, name_norm) VALUES (new.id, new.name_norm); END",
+    "CREATE TRIGGER IF NOT EXISTS employees_fts_ad AFTER DELETE ON employees BEGIN "
+    "INSERT INTO employees_fts(employees_fts, rowid, name_norm) VALUES ('delete', old.id, old.name_norm); END",
+    "CREATE TRIGGER IF NOT EXISTS employees_fts_au AFTER UPDATE OF name_norm ON employees BEGIN "
+    "INSERT INTO employees_fts(employees_fts, rowid, name_norm) VALUES ('delete', old.id, old.name_norm); "
+    "INSERT INTO employees_fts(rowid, name_norm) VALUES (new.id, new.name_norm); END",
+]
+EMPLOYEE_SEARCH_DDL_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_employees_name_norm_trgm "
+    "ON employees USING gin (name_norm gin_trgm_ops)",
+]
+
+for _sql in EMPLOYEE_SEARCH_DDL_SQLITE:
+    event.listen(Employee.__table__, "after_create", DDL(_sql).execute_if(dialect="sqlite"))
+for _sql in EMPLOYEE_SEARCH_DDL_POSTGRES:
+    event.listen(Employee.__table__, "after_create", DDL(_sql).execute_if(dialect="postgresql"))
+
+
 # ======================================================
 # ASISTENCIAS
 # ======================================================
@@ -117,7 +203,8 @@ class Attendance(db.Model):
 class ExtraHours(db.Model):
     """
     Una fila por empleado y fecha.
-    hours guardado como string para permitir coma decimal (0,5)
+    hours guardado como string para permitir coma decimal (0,5) -> solo para mostrar.
+    hours_num es el valor numérico (para SUM en SQL).
     """
     __tablename__ = "extra_hours"
 
@@ -126,6 +213,7 @@ class ExtraHours(db.Model):
 
     day = db.Column(db.String(10), nullable=False)  # YYYY-MM-DD
     hours = db.Column(db.String(20), nullable=False, default="")  # "0,5"
+    hours_num = db.Column(db.Float, nullable=False, default=0.0, server_default="0")  # 0.5
 
     created_at = db.Column(
         db.DateTime, server_default=db.func.now(), nullable=False
@@ -149,6 +237,54 @@ class ExtraHours(db.Model):
         return f"<ExtraHours emp={self.employee_id} day={self.day} hours={self.hours}>"
 
 
+# ======================================================
+# RESUMEN MENSUAL ASISTENCIAS (mantenido en cada escritura)
+# ======================================================
+
+class AttendanceMonthSummary(db.Model):
+    """
+    Una fila por empleado y mes (month_key = "YYYY-MM").
+    Contadores por código + total de horas extra.
+    Se actualiza en la misma transacción que Attendance / ExtraHours;
+    `flask rebuild-asistencias-summary` lo recalcula desde cero.
+    """
+    __tablename__ = "attendance_month_summary"
+
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey("employees.id"), nullable=False)
+    month_key = db.Column(db.String(7), nullable=False)  # YYYY-MM
+
+    code_1 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    code_f = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    code_d = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    code_v = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    code_e = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    code_l = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    code_o = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    code_m = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    code_c = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    extra_hours_total = db.Column(db.Float, nullable=False, default=0.0, server_default="0")
+
+    updated_at = db.Column(
+        db.DateTime,
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+        nullable=False,
+    )
+
+    employee = db.relationship(
+        "Employee", backref=db.backref("month_summaries", lazy=True)
+    )
+
+    __table_args__ = (
+        db.UniqueConstraint("employee_id", "month_key", name="uq_employee_month_summary"),
+    )
+
+    def __repr__(self):
+        return f"<AttendanceMonthSummary emp={self.employee_id} month={self.month_key}>"
+
+
 # ======================================================
 # COMENTARIOS ASISTENCIAS (INICIO / FIN)
 # ======================================================
@@ -190,6 +326,41 @@ class AsistenciasComment(db.Model):
         return f"<AsistenciasComment hub={self.hub_id} month={self.month_key}>"
 
 
+# ======================================================
+# CAMBIOS ASISTENCIAS (feed para sync incremental)
+# ======================================================
+
+class AsistenciasChange(db.Model):
+    """
+    Log de cambios del apartado Asistencias por HUB.
+    id es el cursor monotónico que usa el frontend (?since=<id>).
+    kind: "day" | "extra_hours" | "comments" | "reload"
+    ("reload" = cambio masivo o de empleados -> recargar el mes entero)
+    """
+    __tablename__ = "asistencias_changes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    hub_id = db.Column(db.Integer, db.ForeignKey("hubs.id"), nullable=False)
+
+    month_key = db.Column(db.String(7), nullable=False, default="")  # YYYY-MM ("" = todos)
+    kind = db.Column(db.String(20), nullable=False)
+
+    employee_id = db.Column(db.Integer, nullable=True)
+    day = db.Column(db.String(10), nullable=False, default="")  # YYYY-MM-DD
+    value = db.Column(db.Text, nullable=False, default="")
+
+    created_at = db.Column(
+        db.DateTime, server_default=db.func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        db.Index("ix_asistencias_changes_hub_id", "hub_id", "id"),
+    )
+
+    def __repr__(self):
+        return f"<AsistenciasChange #{self.id} hub={self.hub_id} {self.kind}>"
+
+
 # ======================================================
 # COMENTARIOS Liquidaciones (INICIO / FIN)
 # ======================================================
@@ -219,7 +390,7 @@ class LiquidacionEntry(db.Model):
     """
     Una fila por (ruta, día).
     Guarda lo del Excel: repartidor, metalico, ingreso
-    diferencia se calcula en frontend/back (no hace falta columna).
+    diferencia = metalico - ingreso, se calcula en SQL con las columnas *_cents.
     """
     __tablename__ = "liquidacion_entries"
 
@@ -228,14 +399,24 @@ class LiquidacionEntry(db.Model):
 
     day = db.Column(db.String(10), nullable=False)  # "YYYY-MM-DD"
     repartidor = db.Column(db.String(200), nullable=False, default="")
+    # clave normalizada del repartidor (normalize_name_key) para el libro por conductor
+    repartidor_key = db.Column(db.String(200), nullable=False, default="", server_default="")
+    driver_id = db.Column(db.Integer, db.ForeignKey("drivers.id"), nullable=True)
 
     # guardamos como string para permitir coma "1.268,05"
     metalico = db.Column(db.String(50), nullable=False, default="")
     ingreso = db.Column(db.String(50), nullable=False, default="")
 
+    # mismo importe en céntimos (to_float_es al escribir) -> SUM en SQL
+    metalico_cents = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    ingreso_cents = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     # ✅ NUEVO: comentario por día (opcional)
     comment = db.Column(db.String(500), nullable=False, default="")
 
+    # +1 en cada escritura: precondición del PATCH (updated_at va a segundos en SQLite)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
     created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
     updated_at = db.Column(
         db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), nullable=False
@@ -245,6 +426,54 @@ class LiquidacionEntry(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("route_id", "day", name="uq_route_day"),
+        db.Index("ix_liq_entries_repartidor_key_day", "repartidor_key", "day"),
+        db.Index("ix_liq_entries_driver_day", "driver_id", "day"),
+    )
+
+class LiquidacionReportCache(db.Model):
+    """
+    Informe de cuadre ya calculado por (HUB, mes), en JSON.
+    Al escribir en liquidacion_entries de ese HUB/mes se sube version y se
+    vacía payload -> solo se recalcula el mes que cambia. El lector solo
+    guarda su cálculo si version no cambió mientras tanto (varios workers).
+    """
+    __tablename__ = "liquidacion_report_cache"
+
+    id = db.Column(db.Integer, primary_key=True)
+    hub_id = db.Column(db.Integer, db.ForeignKey("hubs.id"), nullable=False)
+    month_key = db.Column(db.String(7), nullable=False)  # YYYY-MM
+
+    payload = db.Column(db.Text, nullable=False, default="")  # "" = hay que recalcular
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("hub_id", "month_key", name="uq_liq_report_hub_month"),
+    )
+
+class LiquidacionMonthRollup(db.Model):
+    """
+    Totales por (ruta, mes) en céntimos. Se recalcula la ruta/mes tocada
+    en la misma transacción que liquidacion_entries -> analítica YoY / 12 meses
+    lee solo estas filas. `flask rebuild-liquidaciones-rollup` lo rehace entero.
+    """
+    __tablename__ = "liquidacion_month_rollup"
+
+    id = db.Column(db.Integer, primary_key=True)
+    route_id = db.Column(db.Integer, db.ForeignKey("liquidacion_rutas.id"), nullable=False)
+    month_key = db.Column(db.String(7), nullable=False)  # YYYY-MM
+
+    days = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    metalico_cents = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    ingreso_cents = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    updated_at = db.Column(
+        db.DateTime, server_default=db.func.now(), onupdate=db.func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        db.UniqueConstraint("route_id", "month_key", name="uq_liq_rollup_route_month"),
     )
 
 # ======================================================
@@ -269,6 +498,7 @@ class FlotaVehiculo(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("hub_id", "matricula", name="uq_hub_matricula"),
+        active_index("ix_flota_vehiculos_hub_active_matricula", "hub_id", "matricula"),
     )
 
 
@@ -292,6 +522,7 @@ class KilosLitros(db.Model):
 
     # ✅ quién lleva la ruta
     nombre = db.Column(db.String(120), nullable=False, default="")
+    driver_id = db.Column(db.Integer, db.ForeignKey("drivers.id"), nullable=True)
 
     clientes = db.Column(db.Integer, nullable=False, default=0)
     kilos = db.Column(db.Float, nullable=False, default=0)
@@ -307,6 +538,74 @@ class KilosLitros(db.Model):
     __table_args__ = (
         # ✅ Un registro por HUB + día + ruta (activo)
         db.UniqueConstraint("hub_id", "day", "ruta_numero", "active", name="uq_hub_day_ruta_kilos"),
+        # listado por mes (?year=&month=) y listado paginado (day, ruta_numero, id)
+        active_index("ix_kilos_litros_hub_active_month", "hub_id", "year", "month", "day", "ruta_numero"),
+        active_index("ix_kilos_litros_hub_active_day", "hub_id", "day", "ruta_numero", "id"),
+        db.Index("ix_kilos_litros_driver_day", "driver_id", "day"),
+    )
+
+
+class KilosLitrosRollup(db.Model):
+    """
+    Totales de kilos_litros por HUB y periodo, ya agregados para las gráficas.
+    grain: "day" | "week" (lunes) | "month"; period = primer día "YYYY-MM-DD".
+    dim: "hub" (dim_key "") | "ruta" (número) | "nombre" (normalize_name_key).
+    Se recalculan los periodos del día tocado en cada alta / edición / borrado.
+    """
+    __tablename__ = "kilos_litros_rollup"
+
+    id = db.Column(db.Integer, primary_key=True)
+    hub_id = db.Column(db.Integer, db.ForeignKey("hubs.id"), nullable=False)
+
+    grain = db.Column(db.String(5), nullable=False)
+    period = db.Column(db.String(10), nullable=False)  # "YYYY-MM-DD"
+    dim = db.Column(db.String(6), nullable=False)
+    dim_key = db.Column(db.String(200), nullable=False, default="")
+    label = db.Column(db.String(200), nullable=False, default="")
+
+    registros = db.Column(db.Integer, nullable=False, default=0)
+    clientes = db.Column(db.Integer, nullable=False, default=0)
+    kilos = db.Column(db.Float, nullable=False, default=0)
+    litros = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "hub_id", "grain", "dim", "dim_key", "period", name="uq_kilos_rollup_series_period"
+        ),
+    )
+
+
+class HubDailyFact(db.Model):
+    """
+    Hecho diario por HUB y ruta: asistencia (1/F), kilos/litros y caja.
+    route = "" -> fila total del HUB (la asistencia solo va aquí).
+    Rutas numéricas sin ceros a la izquierda ("07" == 7) para cruzar kilos y liquidaciones.
+    Se recalcula en la misma transacción que las escrituras de asistencia, kilos
+    y liquidaciones (HUB + días tocados); `flask refresh-hub-facts` lo rehace por rango.
+    """
+    __tablename__ = "hub_daily_facts"
+
+    id = db.Column(db.Integer, primary_key=True)
+    hub_id = db.Column(db.Integer, db.ForeignKey("hubs.id"), nullable=False)
+    day = db.Column(db.String(10), nullable=False)  # "YYYY-MM-DD"
+    route = db.Column(db.String(50), nullable=False, default="")
+
+    dias_trabajados = db.Column(db.Integer, nullable=False, default=0)  # códigos 1 + F
+    festivos = db.Column(db.Integer, nullable=False, default=0)  # código F
+
+    kilos_registros = db.Column(db.Integer, nullable=False, default=0)
+    clientes = db.Column(db.Integer, nullable=False, default=0)
+    kilos = db.Column(db.Float, nullable=False, default=0)
+    litros = db.Column(db.Float, nullable=False, default=0)
+
+    liq_registros = db.Column(db.Integer, nullable=False, default=0)
+    metalico_cents = db.Column(db.Integer, nullable=False, default=0)
+    ingreso_cents = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("hub_id", "day", "route", name="uq_hub_daily_fact"),
     )
 
 
@@ -338,6 +637,10 @@ class HubCompra(db.Model):
 
     hub = db.relationship("Hub", backref=db.backref("compras", lazy=True))
 
+    __table_args__ = (
+        active_index("ix_hub_compras_hub_active_created", "hub_id", "created_at", "id"),
+    )
+
 # ----------------------------------------------------------------------------------------
 # Incidencias Flota
 # ----------------------------------------------------------------------------------------
@@ -385,6 +688,7 @@ class Contacto(db.Model):
     __table_args__ = (
         # evita duplicar el mismo teléfono en el mismo HUB
         db.UniqueConstraint("hub_id", "telefono", name="uq_hub_telefono_contacto"),
+        active_index("ix_hub_contactos_hub_active_nombre", "hub_id", "nombre", "id"),
     )
 
 
@@ -431,6 +735,7 @@ class RepartoCliente(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("hub_id", "route_id", "cliente_codigo", name="uq_reparto_hub_route_cliente"),
+        active_index("ix_reparto_clientes_hub_route_activo_nombre", "hub_id", "route_id", "nombre", flag="activo"),
     )
 
 
@@ -1,4 +1,5 @@
 # seed_liquidaciones.py
+from sqlalchemy import select, update
 from models import db, Hub, LiquidacionRuta
 
 ROUTES_BY_HUB = {
@@ -11,31 +12,93 @@ ROUTES_BY_HUB = {
     "Caceres": ["103", "143", "310", "320", "340", "350"],
 }
 
+
+def sync_hub_routes(routes_by_hub_id, reactivate=True, deactivate_missing=True):
+    """
+    Deja las rutas de cada HUB como en el mapeo {hub_id: [códigos]}.
+    Un solo SELECT para todos los HUBs; inserta las nuevas, reactiva las
+    inactivas que vuelven y (si deactivate_missing) desactiva las que faltan.
+    HUBs que no están en el mapeo no se tocan. No hace commit.
+    Devuelve {hub_id: {"created": [...], "reactivated": [...], "deactivated": [...]}}.
+    """
+    wanted = {}
+    for hub_id, codes in routes_by_hub_id.items():
+        clean = []
+        for c in codes or []:
+            c = str(c).strip()
+            if c and c not in clean:
+                clean.append(c)
+        wanted[hub_id] = clean
+
+    result = {hid: {"created": [], "reactivated": [], "deactivated": []} for hid in wanted}
+    if not wanted:
+        return result
+
+    existing = {}
+    for r in db.session.execute(
+        select(LiquidacionRuta.id, LiquidacionRuta.hub_id, LiquidacionRuta.code, LiquidacionRuta.active)
+        .where(LiquidacionRuta.hub_id.in_(list(wanted)))
+    ):
+        existing[(r.hub_id, r.code)] = r
+
+    inserts, to_on, to_off = [], [], []
+    for hub_id, codes in wanted.items():
+        for code in codes:
+            r = existing.get((hub_id, code))
+            if r is None:
+                inserts.append({"hub_id": hub_id, "code": code, "active": True})
+                result[hub_id]["created"].append(code)
+            elif not r.active and reactivate:
+                to_on.append(r.id)
+                result[hub_id]["reactivated"].append(code)
+
+    if deactivate_missing:
+        for (hub_id, code), r in existing.items():
+            if r.active and code not in wanted[hub_id]:
+                to_off.append(r.id)
+                result[hub_id]["deactivated"].append(code)
+
+    if inserts:
+        db.session.execute(LiquidacionRuta.__table__.insert(), inserts)
+    if to_on:
+        db.session.execute(
+            update(LiquidacionRuta).where(LiquidacionRuta.id.in_(to_on)).values(active=True)
+        )
+    if to_off:
+        db.session.execute(
+            update(LiquidacionRuta).where(LiquidacionRuta.id.in_(to_off)).values(active=False)
+        )
+
+    return result
+
+
 def seed_liquidaciones():
     """
     Seed de hubs + rutas de liquidaciones.
     IMPORTANT: este archivo NO importa app (evita import circular).
     Debe ejecutarse dentro de un app.app_context() desde app.py o desde un runner.
+    Solo añade lo que falta: no reactiva ni desactiva rutas tocadas desde la app.
     """
-    for hub_name, routes in ROUTES_BY_HUB.items():
-        hub = Hub.query.filter_by(name=hub_name).first()
+    hubs = {
+        h.name: h
+        for h in Hub.query.filter(Hub.name.in_(list(ROUTES_BY_HUB))).all()
+    }
 
-        if not hub:
-            hub = Hub(name=hub_name)
-            db.session.add(hub)
-            db.session.commit()
+    for hub_name in ROUTES_BY_HUB:
+        if hub_name not in hubs:
+            hubs[hub_name] = Hub(name=hub_name)
+            db.session.add(hubs[hub_name])
             print(f"✅ Hub creado: {hub_name}")
+    db.session.flush()
 
-        for code in routes:
-            exists = LiquidacionRuta.query.filter_by(hub_id=hub.id, code=code).first()
-            if exists:
-                print(f"↪ Ruta ya existe: {hub_name} - {code}")
-                continue
-
-            r = LiquidacionRuta(hub_id=hub.id, code=code, active=True)
-            db.session.add(r)
-            print(f"➕ Ruta creada: {hub_name} - {code}")
+    result = sync_hub_routes(
+        {hubs[name].id: routes for name, routes in ROUTES_BY_HUB.items()},
+        reactivate=False,
+        deactivate_missing=False,
+    )
+    for name in ROUTES_BY_HUB:
+        for code in result[hubs[name].id]["created"]:
+            print(f"➕ Ruta creada: {name} - {code}")
 
     db.session.commit()
     print("\n🎉 Seed de rutas de liquidaciones completado")
-
@@ -1,5 +1,7 @@
 import { useEffect, useMemo, useState } from "react";
 
+const COMPRAS_PAGE = 200; // filas por página del listado ("Cargar más" pide la siguiente)
+
 export default function Compras({ hub, notify }) {
   const token = useMemo(() => localStorage.getItem("token"), []);
   const [items, setItems] = useState([]);
@@ -15,6 +17,8 @@ export default function Compras({ hub, notify }) {
   const [deletingId, setDeletingId] = useState(null);
   const [updatingId, setUpdatingId] = useState(null);
   const [error, setError] = useState("");
+  const [nextCursor, setNextCursor] = useState("");
+  const [loadingMore, setLoadingMore] = useState(false);
 
   // edición inline
   const [editId, setEditId] = useState(null);
@@ -95,35 +99,62 @@ export default function Compras({ hub, notify }) {
     setEditComprado(false);
   }
 
+  // una página del listado (más recientes primero); cursor = next_cursor anterior
+  async function fetchComprasPage(cursor) {
+    const base = import.meta.env.VITE_API_URL || "";
+    const qs = new URLSearchParams({ limit: String(COMPRAS_PAGE) });
+    if (cursor) qs.set("cursor", cursor);
+    const res = await fetch(`${base}/api/hubs/${encodeURIComponent(hub)}/compras?${qs}`, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+
+    const text = await res.text();
+    const json = text ? JSON.parse(text) : {};
+    if (!res.ok) throw new Error(json?.error || "Error cargando compras");
+
+    // normalizar defaults por si el backend no manda cantidad/precio
+    const list = (Array.isArray(json.items) ? json.items : []).map((x) => ({
+      ...x,
+      cantidad: x.cantidad ?? 1,
+      precio: x.precio ?? 1,
+    }));
+    return { list, next: json.next_cursor || "" };
+  }
+
   async function loadCompras() {
     setLoading(true);
     setError("");
     try {
-      const base = import.meta.env.VITE_API_URL || "";
-      const res = await fetch(`${base}/api/hubs/${encodeURIComponent(hub)}/compras`, {
-        headers: { Authorization: `Bearer ${token}` },
-      });
-
-      const text = await res.text();
-      const json = text ? JSON.parse(text) : {};
-      if (!res.ok) throw new Error(json?.error || "Error cargando compras");
-
-      const list = Array.isArray(json.items) ? json.items : [];
-      // normalizar defaults por si el backend no manda cantidad/precio
-      const normalized = list.map((x) => ({
-        ...x,
-        cantidad: x.cantidad ?? 1,
-        precio: x.precio ?? 1,
-      }));
-      setItems(normalized);
+      const { list, next } = await fetchComprasPage("");
+      setItems(list);
+      setNextCursor(next);
     } catch (e) {
       setItems([]);
+      setNextCursor("");
       setError(e.message || "Error");
     } finally {
       setLoading(false);
     }
   }
 
+  async function loadMore() {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    setError("");
+    try {
+      const { list, next } = await fetchComprasPage(nextCursor);
+      setItems((prev) => {
+        const seen = new Set(prev.map((x) => x.id));
+        return [...prev, ...list.filter((x) => !seen.has(x.id))];
+      });
+      setNextCursor(next);
+    } catch (e) {
+      setError(e.message || "Error");
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   async function addCompra() {
     const name = String(item).trim();
     if (!name) {
@@ -315,6 +346,7 @@ export default function Compras({ hub, notify }) {
 
   useEffect(() => {
     setItems([]);
+    setNextCursor("");
     setError("");
     cancelEdit();
     clearForm();
@@ -419,7 +451,7 @@ export default function Compras({ hub, notify }) {
 
       <div style={styles.tableWrap}>
         <div style={styles.tableTitle}>
-          <b>Lista</b> <span style={{ opacity: 0.7 }}>· {items.length} items</span>
+          <b>Lista</b> <span style={{ opacity: 0.7 }}>· {items.length} items{nextCursor ? " (hay más)" : ""}</span>
         </div>
 
         {items.length === 0 ? (
@@ -532,6 +564,14 @@ export default function Compras({ hub, notify }) {
             </tbody>
           </table>
         )}
+
+        {nextCursor && (
+          <div style={styles.more}>
+            <button style={styles.btn} onClick={loadMore} disabled={loadingMore || loading}>
+              {loadingMore ? "Cargando..." : "Cargar más"}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -566,6 +606,8 @@ const styles = {
 
   filters: { display: "flex", gap: 8, flexWrap: "wrap", alignItems: "center" },
 
+  more: { display: "flex", justifyContent: "center", padding: 12 },
+
   btn: {
     padding: "10px 12px",
     borderRadius: 10,